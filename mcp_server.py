@@ -1,16 +1,41 @@
-from typing import Any, List
-import httpx
+from typing import List
 import json
 from mcp.server.fastmcp import FastMCP
-from tool_helpers.file_search_helpers import file_search_helper
-from tool_helpers.rag_ingest_helpers import ingest_documents_pipeline
-from tool_helpers.rag_retrieval_helpers import retrieve_documents_pipeline
+from tool_helpers.file_search_helpers import (
+    file_search_helper, file_suffix_search_helper, invalidate_search_cache
+)
+
+# Faster JSON serialization for retrieval responses (optional)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# RAG support (needs torch, open_clip and chromadb)
+try:
+    from tool_helpers.rag_ingest_helpers import ingest_documents_pipeline
+    from tool_helpers.rag_retrieval_helpers import retrieve_documents_pipeline
+    RAG_AVAILABLE = True
+except ImportError:
+    RAG_AVAILABLE = False
 
 
 mcp = FastMCP()
 
+# Most paths listed by get_paths_to_files_by_extension, to keep responses small
+EXTENSION_SEARCH_MAX_RESULTS = 200
+
+
+def dumps_response(data) -> str:
+    """Serialize a tool response as indented, non-ASCII-escaped JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
 @mcp.tool()
-def get_path_to_file_based_on_parent_directory(parent_directory: str, target_file: str) -> str:
+def get_path_to_file_based_on_parent_directory(parent_directory: str, target_file: str, force_refresh: bool = False) -> str:
     
     """
     Searches for a target file in a given parent directory using direct traversal.
@@ -18,11 +43,12 @@ def get_path_to_file_based_on_parent_directory(parent_directory: str, target_fil
     This tool performs a recursive search through the specified parent directory
     and all its subdirectories to find the target file. It uses direct traversal
     instead of generating a full directory tree first, making it efficient for
-    finding single files.
+    finding single files. Results are cached per parent directory for 20 minutes.
     
     Args:
         parent_directory: The parent directory path to search in (e.g., "C:\\Users\\John\\Desktop")
         target_file: The name of the file to search for (e.g., "example.txt")
+        force_refresh: Set to true to ignore cached results, e.g. when the file was just created (default: false)
     
     Returns:
         str: Full path to the file if found, or an error message if not found
@@ -34,6 +60,9 @@ def get_path_to_file_based_on_parent_directory(parent_directory: str, target_fil
     """
 
     try:
+        if force_refresh:
+            invalidate_search_cache(parent_directory)
+        
         # Use the file search helper to find the file
         file_path = file_search_helper(target_file, parent_directory)
         
@@ -47,6 +76,56 @@ def get_path_to_file_based_on_parent_directory(parent_directory: str, target_fil
 
 
 @mcp.tool()
+def get_paths_to_files_by_extension(parent_directory: str, extensions: List[str]) -> str:
+    
+    """
+    Lists every file with the given extensions in a parent directory and its subdirectories.
+    
+    Use this instead of searching file by file when the exact names are not known,
+    e.g. to collect all markdown or PDF files under a folder before ingesting them.
+    
+    Args:
+        parent_directory: The parent directory path to search in (e.g., "C:\\Users\\John\\Desktop")
+        extensions: File extensions to match (e.g., [".md", ".txt"]; "md" and "*.md" also work)
+    
+    Returns:
+        str: Newline-separated full paths of the matching files (at most 200, with the
+             total count), or a message if none were found. Extensions match case-insensitively.
+    
+    Example:
+        parent_directory: "C:\\Users\\John\\Desktop"
+        extensions: [".md"]
+        Returns: "Found 2 files:" followed by one full path per line
+    """
+
+    try:
+        if not extensions:
+            return "Error: No file extensions provided for search"
+        
+        # Accept "md", ".md" and glob-style "*.md"
+        extensions = [ext.lstrip('*') for ext in extensions]
+        suffixes = tuple(ext if ext.startswith('.') else f".{ext}" for ext in extensions if ext)
+        if not suffixes:
+            return "Error: No file extensions provided for search"
+        
+        file_paths, total_count = file_suffix_search_helper(
+            suffixes, parent_directory, max_results=EXTENSION_SEARCH_MAX_RESULTS
+        )
+        
+        if len(file_paths) == EXTENSION_SEARCH_MAX_RESULTS and total_count > len(file_paths):
+            return (
+                f"Found {total_count} files, showing the first {len(file_paths)}:\n"
+                + "\n".join(file_paths)
+            )
+        elif file_paths:
+            return f"Found {len(file_paths)} files:\n" + "\n".join(file_paths)
+        else:
+            return f"No files with extensions {', '.join(suffixes)} found in directory '{parent_directory}' or its subdirectories."
+            
+    except Exception as e:
+        return f"Error searching for files: {str(e)}"
+
+
 def ingest_documents(file_paths: List[str]) -> str:
     r"""
     Ingests documents from given file paths into a vector database for RAG capabilities.
@@ -55,7 +134,7 @@ def ingest_documents(file_paths: List[str]) -> str:
     1. Extracts text from files (.txt, .md formats supported)
     2. Chunks text at sentence level for optimal context
     3. Generates embeddings using OpenAI's CLIP model (local, no API key required)
-    4. Stores vectors in ChromaDB with 20-minute persistence
+    4. Stores vectors in a persistent ChromaDB collection
 
     IMPORTANT - Windows Path Format:
         Windows directory paths MUST use double backslashes (\\) to avoid escape character issues.
@@ -89,7 +168,6 @@ def ingest_documents(file_paths: List[str]) -> str:
         return f"❌ Error during document ingestion: {str(e)}"
 
 
-@mcp.tool()
 def retrieve_relevant_chunks(user_question: str, top_k: int = 5) -> str:
     """
     Retrieves the most relevant document chunks for answering a user question using RAG.
@@ -140,7 +218,7 @@ def retrieve_relevant_chunks(user_question: str, top_k: int = 5) -> str:
                 "relevant_chunks": chunks_info
             }
             
-            return f"✅ Retrieved {result['retrieved_count']} relevant chunks from vector database:\n\n{json.dumps(response_data, indent=2, ensure_ascii=False)}"
+            return f"✅ Retrieved {result['retrieved_count']} relevant chunks from vector database:\n\n{dumps_response(response_data)}"
         else:
             return f"❌ Retrieval failed: {result['message']}"
             
@@ -148,5 +226,11 @@ def retrieve_relevant_chunks(user_question: str, top_k: int = 5) -> str:
         return f"❌ Error during chunk retrieval: {str(e)}"
 
 
+# Only expose the RAG tools when their dependencies could be imported
+if RAG_AVAILABLE:
+    mcp.tool()(ingest_documents)
+    mcp.tool()(retrieve_relevant_chunks)
+
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")
\ No newline at end of file
@@ -1,30 +1,92 @@
 import os
+import stat
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Directory names skipped during traversal
+EXCLUDE_DIRS = frozenset({'.git', '__pycache__', '.venv'})
+
+# Thread pool settings for the parallel breadth-first search
+SEARCH_MAX_WORKERS = 16
+PARALLEL_SCAN_THRESHOLD = 4
+
+# Number of tree lines buffered before each write
+TREE_WRITE_BATCH_SIZE = 4096
+
+# LRU cache of directory listings: path -> (st_mtime_ns, [(name, is_dir, is_file), ...])
+DIR_CACHE_MAX_SIZE = 4096
+_dir_cache = OrderedDict()
+_dir_cache_lock = threading.Lock()
+
+# Filename -> paths index per searched parent, kept for 20 minutes like the vector DB
+FILE_INDEX_TTL_SECONDS = 20 * 60
+FILE_INDEX_MAX_PARENTS = 64
+_file_index = OrderedDict()
+_file_index_lock = threading.Lock()
+
+def _dir_prefix(dir_path):
+    """Return the directory path with a trailing separator, so children can be built by concatenation"""
+    if dir_path.endswith(os.sep) or (os.altsep and dir_path.endswith(os.altsep)):
+        return dir_path
+    return dir_path + os.sep
+
+
+def _list_tree_entries(dir_path):
+    """Return (lowercased name, name, is_dir) tuples for a directory, case-insensitively sorted"""
+    with os.scandir(dir_path) as it:
+        # DirEntry caches the d_type from readdir, so is_dir() needs no extra stat.
+        # Symlinked directories are listed but not descended into, which avoids cycles.
+        # The lowercased name is computed once per entry and used as the sort key.
+        entries = [
+            (e.name.lower(), e.name, e.is_dir(follow_symlinks=False))
+            for e in it if e.name not in EXCLUDE_DIRS
+        ]
+    entries.sort()
+    return entries
+
+
+def _tree_frame(dir_path, prefix):
+    """List a directory into a (path, prefix, entry iterator, entry count) stack frame"""
+    entries = _list_tree_entries(dir_path)
+    return dir_path, prefix, enumerate(entries), len(entries)
 
-exclude_dirs = {'.git', '__pycache__', '.venv'}
 
 def directory_tree_generator(dir_path, prefix='', file=None):
-    entries = [e for e in os.listdir(dir_path) if e not in exclude_dirs]
-    entries_count = len(entries)
+    # Explicit stack of frames instead of recursion, so deep trees cannot hit
+    # the recursion limit. The root is resolved to an absolute path once and
+    # every directory path keeps a trailing separator, so child paths are a
+    # plain string concatenation instead of an os.path.join per entry.
+    stack = [_tree_frame(_dir_prefix(os.path.abspath(dir_path)), prefix)]
 
-    # print(entries)
-    
-    # print(entries_count)
+    # Lines are batched so large trees need one write per batch, not per entry
+    write = file.write if file else sys.stdout.write
+    lines = []
 
-    for i, entry in enumerate(sorted(entries, key=str.lower)):
-        path = os.path.join(dir_path, entry)
-        connector = '└── ' if i == entries_count - 1 else '├── '
+    while stack:
+        current_path, current_prefix, entries_iter, entries_count = stack[-1]
 
-        line = prefix + connector + entry + '\n'
-        if file:
-            file.write(line)
-        else:
-            print(line, end='')
+        for i, (_, entry, is_dir) in entries_iter:
+            connector = '└── ' if i == entries_count - 1 else '├── '
 
-        if os.path.isdir(path):
-            extension = '    ' if i == entries_count - 1 else '│   '
+            lines.append(current_prefix + connector + entry + '\n')
+            if len(lines) >= TREE_WRITE_BATCH_SIZE:
+                write(''.join(lines))
+                lines.clear()
+
+            if is_dir:
+                extension = '    ' if i == entries_count - 1 else '│   '
+
+                # descend into the directory, resuming this one once it is done
+                stack.append(_tree_frame(current_path + entry + os.sep, current_prefix + extension))
+                break
+        else:
+            stack.pop()
 
-            # recursive call for traversing directories
-            directory_tree_generator(path, prefix + extension, file)
+    if lines:
+        write(''.join(lines))
 
 # Usage example:
 # root_folder = r'D:\\STUFF\\Projects\\MCP_File_System'
@@ -33,10 +95,238 @@ def directory_tree_generator(dir_path, prefix='', file=None):
 
 
 
+def _cached_scandir(path):
+    """
+    List a directory, serving unchanged directories from an in-memory LRU cache.
+    
+    A directory's mtime changes whenever an entry is added, removed or renamed,
+    so (path, st_mtime_ns) is enough to tell whether a cached listing is stale.
+    
+    Args:
+        path (str): Directory to list
+    
+    Returns:
+        list: (name, is_dir, is_file) tuples for every entry in the directory.
+              is_dir does not follow symlinks, so linked directories are never
+              descended into (no cycles); is_file does, so links to files count as files.
+    """
+    mtime_ns = os.stat(path).st_mtime_ns
+    
+    with _dir_cache_lock:
+        cached = _dir_cache.get(path)
+        if cached and cached[0] == mtime_ns:
+            _dir_cache.move_to_end(path)
+            return cached[1]
+    
+    with os.scandir(path) as it:
+        # DirEntry answers both from d_type; only symlinks need a stat for is_file()
+        entries = [(e.name, e.is_dir(follow_symlinks=False), e.is_file()) for e in it]
+    
+    with _dir_cache_lock:
+        _dir_cache[path] = (mtime_ns, entries)
+        _dir_cache.move_to_end(path)
+        if len(_dir_cache) > DIR_CACHE_MAX_SIZE:
+            _dir_cache.popitem(last=False)
+    
+    return entries
+
+
+def _scan_directory(current_dir, file_name):
+    """
+    Scan a single directory for the target file and list its entries.
+    
+    Args:
+        current_dir (str): Directory to scan, ending with a path separator
+        file_name (str): Name of the target file to search for, or None to only list
+    
+    Returns:
+        tuple: (current_dir, full path to the file or None, list of (name, is_dir, is_file) entries)
+    """
+    # Path-based calls are used on every platform rather than os.fwalk or dir fds:
+    # the BFS cannot hold an fd open for every pending directory, and opening one
+    # per scan costs more syscalls than the path lookups it would save
+    
+    # Probe for the target with a single stat before listing the directory
+    # (following symlinks, as os.walk listed links to files among the files)
+    probe_hit = False
+    if file_name is not None:
+        try:
+            probe_hit = stat.S_ISREG(os.stat(current_dir + file_name).st_mode)
+        except OSError:
+            pass
+    
+    try:
+        entries = _cached_scandir(current_dir)
+    except (OSError, PermissionError):
+        # Skip unreadable subdirectories, same as os.walk did
+        return current_dir, None, []
+    
+    # The probe ignores case on NTFS and APFS, so confirm a hit against the listing
+    # under the index's own comparison and return the name as it is on disk
+    if probe_hit:
+        name_key = os.path.normcase(file_name)
+        for name, _, is_file in entries:
+            if is_file and os.path.normcase(name) == name_key:
+                return current_dir, current_dir + name, []
+    
+    return current_dir, None, entries
+
+
+def _get_file_index(directory_path, mtime_ns):
+    """
+    Get the filename index for a parent directory, starting a fresh one if it is stale.
+    
+    An index is stale once the TTL has passed or the parent directory's mtime changed.
+    
+    Args:
+        directory_path (str): Parent directory path the index covers
+        mtime_ns (int): Current st_mtime_ns of the parent directory
+    
+    Returns:
+        dict: Index record with "paths" (os.path.normcase'd filename -> list of full paths) and
+              "complete" (True once a search has covered the whole tree)
+    """
+    now = time.time()
+    
+    with _file_index_lock:
+        index = _file_index.get(directory_path)
+        if (index and index["mtime_ns"] == mtime_ns
+                and now - index["created_at"] < FILE_INDEX_TTL_SECONDS):
+            _file_index.move_to_end(directory_path)
+            return index
+        
+        index = {
+            "created_at": now,
+            "mtime_ns": mtime_ns,
+            "paths": {},
+            "complete": False
+        }
+        _file_index[directory_path] = index
+        _file_index.move_to_end(directory_path)
+        if len(_file_index) > FILE_INDEX_MAX_PARENTS:
+            _file_index.popitem(last=False)
+    
+    return index
+
+
+def invalidate_search_cache(directory_path=None):
+    """
+    Drop the filename index and cached directory listings for one parent directory, or for all of them.
+    
+    Indexes are only checked against the parent's own mtime, so files created
+    deeper in the tree can stay hidden until the TTL runs out. Cached listings are
+    cleared too: on filesystems with coarse timestamps (FAT32, HFS+, ext3) an entry
+    created in the same tick as a listing leaves the directory's mtime unchanged.
+    
+    Args:
+        directory_path (str): Parent directory whose caches to drop (default: all)
+    """
+    with _file_index_lock:
+        if directory_path is None:
+            _file_index.clear()
+        else:
+            _file_index.pop(directory_path, None)
+    
+    with _dir_cache_lock:
+        if directory_path is None:
+            _dir_cache.clear()
+        else:
+            # Listings are keyed by the same separator-terminated paths the search builds
+            prefix = _dir_prefix(directory_path)
+            for path in [path for path in _dir_cache if path.startswith(prefix)]:
+                del _dir_cache[path]
+
+
+def _search_tree(file_name, directory_path, index):
+    """
+    Breadth-first search for the target file, recording every file seen into the index.
+    
+    Args:
+        file_name (str): Name of the target file to search for, or None to index the whole tree
+        directory_path (str): Parent directory path to search in
+        index (dict): Index record from _get_file_index to populate
+    
+    Returns:
+        str: Full path to the file if found, None if not found
+    """
+    paths = defaultdict(list)
+    # Directories are queued with a trailing separator so child paths are a
+    # plain string concatenation instead of an os.path.join per entry
+    pending = [_dir_prefix(directory_path)]
+    hit = None
+    
+    with ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS) as executor:
+        while pending and not hit:
+            current_level, pending = pending, []
+            
+            # Small levels are scanned inline to avoid thread overhead
+            if len(current_level) <= PARALLEL_SCAN_THRESHOLD:
+                results = (_scan_directory(d, file_name) for d in current_level)
+            else:
+                futures = [executor.submit(_scan_directory, d, file_name) for d in current_level]
+                # Results are taken in submission order, so when several directories on
+                # one level hold the file, the first in listing order always wins
+                results = (f.result() for f in futures)
+            
+            for current_dir, hit, entries in results:
+                if hit:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    paths[os.path.normcase(file_name)].append(hit)
+                    break
+                
+                for name, is_dir, is_file in entries:
+                    if is_file:
+                        paths[os.path.normcase(name)].append(current_dir + name)
+                    elif is_dir and name not in EXCLUDE_DIRS:
+                        # Queue subdirectories, skipping excluded ones
+                        pending.append(current_dir + name + os.sep)
+    
+    # Only a search that ran to the end has seen every file under the parent
+    index["paths"] = paths
+    index["complete"] = hit is None
+    
+    return hit
+
+
+def _is_regular_file(path):
+    """Check with a single stat that an indexed path is still a regular file (or a link to one)"""
+    try:
+        return stat.S_ISREG(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def _index_for_directory(directory_path):
+    """
+    Get the filename index for a parent directory after checking it is a directory.
+    
+    Args:
+        directory_path (str): Parent directory path to search in
+    
+    Returns:
+        dict: Index record from _get_file_index, or None if the path is not a directory
+    """
+    # One stat answers both "does it exist" and "is it a directory",
+    # and its mtime is reused to validate the filename index
+    try:
+        dir_stat = os.stat(directory_path)
+    except OSError:
+        return None
+    
+    if not stat.S_ISDIR(dir_stat.st_mode):
+        return None
+    
+    return _get_file_index(directory_path, dir_stat.st_mtime_ns)
+
+
 def file_search_helper(file_name, directory_path):
     """
     Direct traversal search for a target file in a given parent directory.
     
+    Results are answered from a per-parent filename index when possible, and
+    the tree is only walked again when the index misses or has gone stale.
+    Names are compared with os.path.normcase (case-insensitively on Windows).
+    
     Args:
         file_name (str): Name of the target file to search for
         directory_path (str): Parent directory path to search in
@@ -44,31 +334,86 @@ def file_search_helper(file_name, directory_path):
     Returns:
         str: Full path to the file if found, None if not found
     """
+    # Only bare file names are searched for: a name with separators or '..'
+    # would make the direct stat probe resolve outside the parent directory
+    if (os.path.basename(file_name) != file_name
+            or file_name in ('', '.', '..')
+            or (os.altsep and os.altsep in file_name)):
+        return None
+
     try:
-        # Check if the directory exists
-        if not os.path.exists(directory_path):
+        index = _index_for_directory(directory_path)
+        if index is None:
             return None
         
-        # Check if the directory is actually a directory
-        if not os.path.isdir(directory_path):
+        # Indexed paths may have been removed since, so confirm before returning
+        for path in index["paths"].get(os.path.normcase(file_name), ()):
+            if _is_regular_file(path):
+                return path
+        
+        # A complete, fresh index that has no entry means the file is not there
+        if index["complete"]:
             return None
         
-        # Walk through all directories and subdirectories
-        for root, dirs, files in os.walk(directory_path):
-            # Filter out excluded directories
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
-            
-            # Check if target file is in current directory
-            if file_name in files:
-                return os.path.join(root, file_name)
+        return _search_tree(file_name, directory_path, index)
         
-        # File not found
+    except (OSError, PermissionError) as e:
+        # Handle permission errors or other OS-related errors
+        print(f"Error accessing directory {directory_path}: {e}")
         return None
+
+
+def file_suffix_search_helper(suffixes, directory_path, max_results=None):
+    """
+    Find every file in a parent directory tree whose name ends with one of the given suffixes.
+    
+    The whole tree is indexed once, then the suffix check runs over the distinct
+    file names in the index with a single str.endswith call per name. Matching
+    is case-insensitive, so ".md" also finds "README.MD".
+    
+    Args:
+        suffixes (tuple): File name endings to match (e.g. (".md", ".txt"))
+        directory_path (str): Parent directory path to search in
+        max_results (int): Most paths to return (default: all)
+    
+    Returns:
+        tuple: (sorted full paths of the matching files, up to max_results,
+                total number of matches in the index); ([], 0) if none or on error
+    """
+    try:
+        suffixes = tuple(suffix.lower() for suffix in suffixes)
+        if not suffixes:
+            return [], 0
+        
+        index = _index_for_directory(directory_path)
+        if index is None:
+            return [], 0
+        
+        # Suffix matches need every file name, so finish indexing the tree first
+        if not index["complete"]:
+            _search_tree(None, directory_path, index)
+        
+        candidates = sorted(
+            path
+            for name, paths in index["paths"].items() if name.lower().endswith(suffixes)
+            for path in paths
+        )
+        
+        # Indexed paths may have been removed since; only the ones that will be
+        # returned are confirmed, not every match in the tree
+        file_paths = []
+        for path in candidates:
+            if max_results is not None and len(file_paths) >= max_results:
+                break
+            if _is_regular_file(path):
+                file_paths.append(path)
+        
+        return file_paths, len(candidates)
         
     except (OSError, PermissionError) as e:
         # Handle permission errors or other OS-related errors
         print(f"Error accessing directory {directory_path}: {e}")
-        return None
+        return [], 0
 
 
 # Test the function (uncomment to test)
@@ -1,14 +1,17 @@
 import os
+import re
+import mmap
 import json
 import time
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 import open_clip
 import torch
+import torch.nn.functional as F
 from datetime import datetime, timedelta
-import nltk
-from nltk.tokenize import sent_tokenize
 
 # PDF support
 try:
@@ -17,74 +20,247 @@ try:
 except ImportError:
     PDF_AVAILABLE = False
 
-# Download required NLTK data (only if not already present)
+# ONNX Runtime support for the CLIP text encoder
 try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
+    import onnxruntime
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
 
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
+# Sentence boundaries: whitespace after ., ! or ? (but not after "e.g." style
+# abbreviations or a list number at the start of a line), a paragraph break,
+# or a line break before a markdown bullet, heading, quote or numbered item
+SENTENCE_SPLIT_RE = re.compile(
+    r'(?<=[.!?])(?<!\.[^\W\d_]\.)(?<!^\d\.)(?<!^\d\d\.)\s+(?=[\w"\'(\[])'
+    r'|\s*\n\s*\n\s*'
+    r'|\s*\n(?=[ \t]*(?:[-*+>]|#+|\d+[.)])[ \t])',
+    re.MULTILINE
+)
 
 # Global ChromaDB client and collection
 CHROMA_CLIENT = None
 CHROMA_COLLECTION = None
-DB_EXPIRY_TIME = 100 
+CHROMA_CHUNK_COUNT = None  # Cached collection.count(), reset whenever chunks are added
+DB_EXPIRY_TIME = None
 DB_PERSIST_PATH = "./chroma_db"
+DB_COLLECTION_NAME = "documents"
+
+# SQLite settings applied to ChromaDB's connection to speed up inserts.
+# journal_mode=OFF and locking_mode=EXCLUSIVE are left out: the first breaks
+# transaction rollback and the second locks out Chroma's other connections.
+DB_SQLITE_PRAGMAS = ("synchronous=OFF", "temp_store=MEMORY")
 
 # Global CLIP model (initialized lazily)
 CLIP_MODEL = None
+CLIP_TOKENIZER = None
 CLIP_DEVICE = None
+CLIP_ENCODE_TEXT = None  # torch.compile'd encode_text (CUDA only)
+
+# Global ONNX Runtime session for the CLIP text encoder (used when onnxruntime is
+# installed and can run on the model's device)
+ORT_SESSION = None
+CLIP_ONNX_PATH = "./clip_textual.onnx"
+
+# Text encoding batch sizes (GPUs stay underused with small batches)
+TEXT_BATCH_SIZE_CUDA = 256
+TEXT_BATCH_SIZE_CPU = 64
+
+# Chunks per collection.upsert call (Chroma inserts fastest in batches of a few hundred)
+DB_INSERT_BATCH_SIZE = 200
+
+# Maximum threads used to read files in parallel during extraction
+EXTRACT_MAX_WORKERS = 32
+
+# Text files larger than this are memory-mapped instead of read into a bytes copy
+MMAP_THRESHOLD_BYTES = 4 * 1024 * 1024
+
+class ClipTextEncoder(torch.nn.Module):
+    """Wraps CLIP's encode_text as a module so it can be exported to ONNX"""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, text):
+        return self.model.encode_text(text)
 
 def init_clip_model():
-    """Initialize CLIP model with CPU/GPU detection"""
-    global CLIP_MODEL, CLIP_DEVICE
+    """Initialize CLIP model and tokenizer with CPU/GPU detection"""
+    global CLIP_MODEL, CLIP_TOKENIZER, CLIP_DEVICE, CLIP_ENCODE_TEXT
     
     if CLIP_MODEL is None:
         print("Loading OpenCLIP model...")
         CLIP_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-        CLIP_MODEL, _, _ = open_clip.create_model_and_transforms('ViT-B-32', pretrained='openai')
-        CLIP_MODEL = CLIP_MODEL.to(CLIP_DEVICE)
+        # Only text is embedded, so skip the image transforms and drop the image tower
+        # before moving to the device (encode_text never touches it)
+        CLIP_MODEL = open_clip.create_model('ViT-B-32', pretrained='openai')
+        if hasattr(CLIP_MODEL, 'visual'):
+            del CLIP_MODEL.visual
+        CLIP_MODEL = CLIP_MODEL.eval().to(CLIP_DEVICE)
+        # Tokenizer loads its BPE vocab on construction, so build it only once
+        CLIP_TOKENIZER = open_clip.get_tokenizer('ViT-B-32')
         print(f"OpenCLIP model loaded on {CLIP_DEVICE}")
+        
+        # Export to ONNX before halving so the exported graph stays FP32 and portable.
+        # On a GPU host ONNX Runtime is only used when it can run on CUDA too: the
+        # CPU-only onnxruntime wheel would leave the GPU idle.
+        if ONNX_AVAILABLE and (CLIP_DEVICE == "cpu"
+                               or "CUDAExecutionProvider" in onnxruntime.get_available_providers()):
+            init_onnx_text_encoder()
+        
+        if ORT_SESSION is not None:
+            # ONNX Runtime does all the encoding, so keep the PyTorch weights off the GPU
+            if CLIP_DEVICE == "cuda":
+                CLIP_MODEL = CLIP_MODEL.cpu()
+                torch.cuda.empty_cache()
+        
+        # FP16 weights halve memory traffic and use tensor cores on the GPU
+        elif CLIP_DEVICE == "cuda":
+            CLIP_MODEL = CLIP_MODEL.half()
+            
+            # Compiled graphs fuse the transformer ops; shapes are kept fixed by
+            # padding batches in encode_text_tokens so it compiles only a few times
+            if hasattr(torch, "compile"):
+                CLIP_ENCODE_TEXT = torch.compile(CLIP_MODEL.encode_text, dynamic=False)
     
-    return CLIP_MODEL, CLIP_DEVICE
+    return CLIP_MODEL, CLIP_TOKENIZER, CLIP_DEVICE
+
+def init_onnx_text_encoder():
+    """Export the CLIP text encoder to ONNX once and open an ONNX Runtime session on it"""
+    global ORT_SESSION
+    
+    try:
+        if not os.path.exists(CLIP_ONNX_PATH):
+            print("Exporting CLIP text encoder to ONNX...")
+            example_tokens = CLIP_TOKENIZER(["example"]).to(CLIP_DEVICE)
+            # Export to a temporary file so a failed export never leaves a broken model behind
+            tmp_path = CLIP_ONNX_PATH + ".tmp"
+            torch.onnx.export(
+                ClipTextEncoder(CLIP_MODEL).eval(),
+                (example_tokens,),
+                tmp_path,
+                opset_version=15,
+                input_names=["text"],
+                output_names=["text_features"],
+                dynamic_axes={"text": {0: "batch"}, "text_features": {0: "batch"}}
+            )
+            os.replace(tmp_path, CLIP_ONNX_PATH)
+        
+        available = onnxruntime.get_available_providers()
+        preferred = ("CUDAExecutionProvider", "CPUExecutionProvider") if CLIP_DEVICE == "cuda" else ("CPUExecutionProvider",)
+        providers = [p for p in preferred if p in available]
+        ORT_SESSION = onnxruntime.InferenceSession(CLIP_ONNX_PATH, providers=providers)
+        # ONNX Runtime silently falls back to the CPU if the CUDA provider fails to start
+        if CLIP_DEVICE == "cuda" and ORT_SESSION.get_providers()[0] != "CUDAExecutionProvider":
+            raise RuntimeError("CUDAExecutionProvider could not be initialized")
+        print(f"ONNX Runtime text encoder loaded with {ORT_SESSION.get_providers()[0]}")
+        
+    except Exception as e:
+        print(f"Warning: ONNX Runtime text encoder unavailable, using PyTorch: {str(e)}")
+        ORT_SESSION = None
+    
+    return ORT_SESSION
+
+def encode_text_tokens(text_tokens: torch.Tensor, to_numpy: bool = True,
+                       pad_to: Optional[int] = None) -> Union[np.ndarray, torch.Tensor]:
+    """
+    Encode tokenized text with CLIP and return L2-normalized float32 embeddings.
+    
+    With to_numpy=False the PyTorch path returns a tensor left on the model's
+    device, so callers can queue more batches before paying for a device sync.
+    ONNX Runtime always returns a NumPy array. pad_to is the caller's batch size:
+    smaller batches are padded up to it for the compiled encoder.
+    """
+    if ORT_SESSION is not None:
+        text_features = ORT_SESSION.run(None, {"text": text_tokens.cpu().numpy()})[0]
+        # Normalize the features (common practice for embeddings)
+        return text_features / np.linalg.norm(text_features, axis=-1, keepdims=True)
+    
+    global CLIP_ENCODE_TEXT
+    
+    model, _, device = init_clip_model()
+    text_tokens = text_tokens.to(device)
+    batch_size = text_tokens.shape[0]
+    
+    # Pad a partial last batch to the caller's batch size so the compiled
+    # encoder sees the same shape every time (single queries pass no pad_to)
+    if CLIP_ENCODE_TEXT is not None and pad_to is not None and batch_size < pad_to:
+        padding = text_tokens.new_zeros((pad_to - batch_size, text_tokens.shape[1]))
+        text_tokens = torch.cat([text_tokens, padding])
+    
+    with torch.no_grad(), torch.autocast("cuda", dtype=torch.float16, enabled=(device == "cuda")):
+        if CLIP_ENCODE_TEXT is not None:
+            try:
+                text_features = CLIP_ENCODE_TEXT(text_tokens)
+            except Exception as e:
+                # torch.compile needs a working Triton/compiler toolchain; fall back to eager
+                print(f"Warning: Compiled CLIP encoder failed, using eager mode: {str(e)}")
+                CLIP_ENCODE_TEXT = None
+                text_features = model.encode_text(text_tokens)
+        else:
+            text_features = model.encode_text(text_tokens)
+        # Normalize the features (common practice for embeddings) in one fused op
+        text_features = F.normalize(text_features[:batch_size], dim=-1)
+    
+    # ChromaDB expects float32 embeddings
+    text_features = text_features.float()
+    return text_features.cpu().numpy() if to_numpy else text_features
 
 def init_chroma_db():
-    """Initialize ChromaDB with 20-minute persistence"""
-    global CHROMA_CLIENT, CHROMA_COLLECTION, DB_EXPIRY_TIME
+    """Initialize the ChromaDB client, reusing it for 20 minutes before reconnecting"""
+    global CHROMA_CLIENT, CHROMA_COLLECTION, CHROMA_CHUNK_COUNT, DB_EXPIRY_TIME
     
     current_time = datetime.now()
     
     # Check if DB is still valid (within 20 minutes)
-    if CHROMA_CLIENT and DB_EXPIRY_TIME and current_time < DB_EXPIRY_TIME:
+    if CHROMA_CLIENT is not None and DB_EXPIRY_TIME is not None and current_time < DB_EXPIRY_TIME:
         return CHROMA_COLLECTION
     
     # Clean up old client if exists
     if CHROMA_CLIENT:
         CHROMA_CLIENT = None
         CHROMA_COLLECTION = None
+    CHROMA_CHUNK_COUNT = None
     
     # Initialize new ChromaDB client with persistence
     CHROMA_CLIENT = chromadb.PersistentClient(path=DB_PERSIST_PATH)
+    tune_chroma_sqlite(CHROMA_CLIENT)
     
-    # Create or get collection
-    collection_name = f"documents_{int(current_time.timestamp())}"
-    try:
-        CHROMA_COLLECTION = CHROMA_CLIENT.create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
-    except Exception:
-        # Collection might already exist
-        CHROMA_COLLECTION = CHROMA_CLIENT.get_collection(name=collection_name)
+    # Stable collection name so ingested chunks survive reconnects
+    CHROMA_COLLECTION = CHROMA_CLIENT.get_or_create_collection(
+        name=DB_COLLECTION_NAME,
+        metadata={"hnsw:space": "cosine"}
+    )
     
     # Set expiry time (20 minutes from now)
     DB_EXPIRY_TIME = current_time + timedelta(minutes=20)
     
     return CHROMA_COLLECTION
 
+def tune_chroma_sqlite(client) -> None:
+    """Apply DB_SQLITE_PRAGMAS to ChromaDB's SQLite connection (best effort, relies on Chroma internals)"""
+    try:
+        server = getattr(client, "_server", client)
+        # chromadb 1.x's default Rust backend owns its SQLite connection and exposes
+        # no _sysdb; there is nothing to tune, so skip quietly on every reconnect
+        if not hasattr(server, "_sysdb"):
+            return
+        conn = server._sysdb._conn_pool.connect()
+        for pragma in DB_SQLITE_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+    except Exception as e:
+        # Internal layout differs between Chroma versions; inserts still work untuned
+        print(f"Warning: Could not tune ChromaDB SQLite settings: {str(e)}")
+
+def get_chunk_count(collection) -> int:
+    """Number of chunks in the collection, counted once and cached until the next insert"""
+    global CHROMA_CHUNK_COUNT
+    
+    if CHROMA_CHUNK_COUNT is None:
+        CHROMA_CHUNK_COUNT = collection.count()
+    
+    return CHROMA_CHUNK_COUNT
+
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text from PDF file using PyPDF2"""
     if not PDF_AVAILABLE:
@@ -115,37 +291,55 @@ def extract_text_from_pdf(file_path: str) -> str:
 def extract_text(file_path: str) -> str:
     """Extract text from file based on format (.txt, .md, .pdf)"""
     try:
-        if not os.path.exists(file_path):
-            return f"Error: File {file_path} not found"
-        
         file_ext = os.path.splitext(file_path)[1].lower()
         
         if file_ext in ['.txt', '.md']:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                content = file.read()
+            # open() reports a missing file itself, so no separate exists() stat is needed.
+            # Binary read and one bulk decode skips the text layer's incremental decoding.
+            with open(file_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size > MMAP_THRESHOLD_BYTES:
+                    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        content = str(mapped, 'utf-8', 'ignore')
+                else:
+                    content = file.read().decode('utf-8', 'ignore')
                 return content.strip()
-        elif file_ext == '.pdf':
+        
+        if not os.path.exists(file_path):
+            return f"Error: File {file_path} not found"
+        
+        if file_ext == '.pdf':
             return extract_text_from_pdf(file_path)
         else:
             return f"Unsupported file format: {file_ext}. Supported formats: .txt, .md, .pdf"
             
+    except FileNotFoundError:
+        return f"Error: File {file_path} not found"
     except Exception as e:
         return f"Error reading file {file_path}: {str(e)}"
 
-def find_and_scan(file_paths: List[str]) -> List[Dict[str, Any]]:
+def find_and_scan(file_paths: List[str], now_iso: Optional[str] = None) -> List[Dict[str, Any]]:
     """Process multiple file paths and extract text, return as JSON format"""
     results = []
     
-    for file_path in file_paths:
-        text_content = extract_text(file_path)
-        
+    # One timestamp for the whole run instead of a datetime.now() per file
+    if now_iso is None:
+        now_iso = datetime.now().isoformat()
+    
+    if not file_paths:
+        return results
+    
+    # Reads release the GIL, so a thread pool overlaps the I/O of many small files
+    with ThreadPoolExecutor(max_workers=min(EXTRACT_MAX_WORKERS, len(file_paths))) as executor:
+        text_contents = list(executor.map(extract_text, file_paths))
+    
+    for file_path, text_content in zip(file_paths, text_contents):
         if not text_content.startswith("Error"):
             result = {
                 "file_path": file_path,
                 "filename": os.path.basename(file_path),
                 "text_content": text_content,
 
-                "extracted_at": datetime.now().isoformat(),
+                "extracted_at": now_iso,
                 
                 "file_size": len(text_content)
             }
@@ -155,18 +349,83 @@ def find_and_scan(file_paths: List[str]) -> List[Dict[str, Any]]:
     
     return results
 
-def chunk_and_vectorize(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Chunk text at sentence level and vectorize using CLIP embeddings"""
-    vectorized_chunks = []
+def embed_chunk_texts(chunk_texts: List[str], tokenizer, device: str, text_batch_size: int) -> np.ndarray:
+    """
+    Encode chunk texts in batches into an (N, D) float32 array.
+    
+    Each batch is tokenized and encoded on its own, so device memory stays bounded
+    by the batch size rather than the corpus size. On CUDA each batch is copied
+    back with a non-blocking copy into one of two pinned host buffers, and that
+    copy is only waited on after the next batch has been queued.
+    """
+    embeddings = None
+    host_buffers = [None, None]
+    pending_copy = None  # (copy done event, pinned buffer, start row, end row)
+    
+    for batch_index, batch_start in enumerate(range(0, len(chunk_texts), text_batch_size)):
+        batch_end = min(batch_start + text_batch_size, len(chunk_texts))
+        batch_embeddings = encode_text_tokens(
+            tokenizer(chunk_texts[batch_start:batch_end]), to_numpy=False, pad_to=text_batch_size
+        )
+        
+        if embeddings is None:
+            embeddings = np.empty((len(chunk_texts), batch_embeddings.shape[1]), dtype=np.float32)
+        
+        # ONNX Runtime and CPU batches are already host memory
+        if not isinstance(batch_embeddings, torch.Tensor) or device != "cuda":
+            embeddings[batch_start:batch_end] = np.asarray(batch_embeddings)
+            continue
+        
+        # The previous batch's copy has been overlapping with this batch's encoding
+        if pending_copy is not None:
+            copy_done, buffer, start, end = pending_copy
+            copy_done.synchronize()
+            embeddings[start:end] = buffer[:end - start].numpy()
+        
+        buffer = host_buffers[batch_index % 2]
+        if buffer is None:
+            buffer = torch.empty((text_batch_size, batch_embeddings.shape[1]),
+                                 dtype=torch.float32, pin_memory=True)
+            host_buffers[batch_index % 2] = buffer
+        buffer[:batch_end - batch_start].copy_(batch_embeddings, non_blocking=True)
+        copy_done = torch.cuda.Event()
+        copy_done.record()
+        pending_copy = (copy_done, buffer, batch_start, batch_end)
+    
+    if pending_copy is not None:
+        copy_done, buffer, start, end = pending_copy
+        copy_done.synchronize()
+        embeddings[start:end] = buffer[:end - start].numpy()
+    
+    return embeddings
+
+def chunk_and_vectorize(documents: List[Dict[str, Any]], text_batch_size: Optional[int] = None,
+                        now_iso: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Chunk text at sentence level and vectorize using CLIP embeddings.
+    
+    Returns parallel columns (ids, embeddings, documents, metadatas) ready for
+    collection.upsert, with embeddings as a single (N, D) float32 array.
+    """
+    ids = []
+    chunk_texts = []
+    metadatas = []
+    
+    # One timestamp for the whole run instead of a datetime.now() per chunk
+    created_at = now_iso if now_iso is not None else datetime.now().isoformat()
     
     # Initialize CLIP model (local, no API key required)
-    model, device = init_clip_model()
+    _, tokenizer, device = init_clip_model()
+    
+    if text_batch_size is None:
+        text_batch_size = TEXT_BATCH_SIZE_CUDA if device == "cuda" else TEXT_BATCH_SIZE_CPU
     
+    # Chunk every document first so encoder batches can span document boundaries
     for doc in documents:
         text_content = doc["text_content"]
         
-        # Chunk at sentence level
-        sentences = sent_tokenize(text_content)
+        # Chunk at sentence level, dropping empty pieces so they do not count toward a chunk
+        sentences = [sentence for sentence in SENTENCE_SPLIT_RE.split(text_content) if sentence]
         
         # Group sentences into chunks (3-5 sentences per chunk for context)
         chunk_size = 4
@@ -176,79 +435,81 @@ def chunk_and_vectorize(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]
             if chunk_text.strip():  # Only add non-empty chunks
                 chunks.append(chunk_text.strip())
         
-        # Generate embeddings for chunks using CLIP
-        if chunks:
-            try:
-                # Process chunks in batches for efficiency
-                batch_size = 32  # CLIP can handle larger batches
-                for batch_start in range(0, len(chunks), batch_size):
-                    batch_chunks = chunks[batch_start:batch_start + batch_size]
-                    
-                    # Tokenize and encode text using OpenCLIP
-                    tokenizer = open_clip.get_tokenizer('ViT-B-32')
-                    text_tokens = tokenizer(batch_chunks).to(device)
-                    
-                    with torch.no_grad():
-                        text_features = model.encode_text(text_tokens)
-                        # Normalize the features (common practice for embeddings)
-                        text_features = text_features / text_features.norm(dim=-1, keepdim=True)
-                    
-                    # Convert to list and store chunk info
-                    for i, embedding in enumerate(text_features.cpu().numpy()):
-                        chunk_idx = batch_start + i
-                        chunk_info = {
-                            "chunk_id": f"{doc['filename']}_{chunk_idx}",
-                            "file_path": doc["file_path"],
-                            "filename": doc["filename"],
-                            "chunk_text": batch_chunks[i],
-                            "embedding": embedding.tolist(),  # Convert numpy array to list
-                            "chunk_index": chunk_idx,
-                            "total_chunks": len(chunks),
-                            "created_at": datetime.now().isoformat()
-                        }
-                        vectorized_chunks.append(chunk_info)
-                    
-            except Exception as e:
-                print(f"Error generating CLIP embeddings for {doc['filename']}: {str(e)}")
+        # Add the document to each column in one pass. Ids are built from the full
+        # path so files with the same name in different folders do not collide.
+        id_prefix = doc["file_path"] + "_"
+        file_path = doc["file_path"]
+        filename = doc["filename"]
+        total_chunks = len(chunks)
+        
+        chunk_texts.extend(chunks)
+        ids.extend([id_prefix + str(chunk_idx) for chunk_idx in range(total_chunks)])
+        metadatas.extend([
+            {
+                "file_path": file_path,
+                "filename": filename,
+                "chunk_index": chunk_idx,
+                "total_chunks": total_chunks,
+                "created_at": created_at
+            }
+            for chunk_idx in range(total_chunks)
+        ])
     
-    return vectorized_chunks
+    # Generate embeddings for all chunks using CLIP
+    embeddings = np.empty((0, 0), dtype=np.float32)
+    if chunk_texts:
+        try:
+            # Full batches across documents keep the GPU busy even for many small files
+            embeddings = embed_chunk_texts(chunk_texts, tokenizer, device, text_batch_size)
+            
+        except Exception as e:
+            print(f"Error generating CLIP embeddings for {len(documents)} documents: {str(e)}")
+            ids, chunk_texts, metadatas = [], [], []
+    
+    return {
+        "ids": ids,
+        "embeddings": embeddings,
+        "documents": chunk_texts,
+        "metadatas": metadatas
+    }
 
-def push_to_db(vectorized_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Push embeddings to ChromaDB"""
+def push_to_db(vectorized_chunks: Dict[str, Any], batch_size: int = DB_INSERT_BATCH_SIZE) -> Dict[str, Any]:
+    """Push embeddings to ChromaDB from the columns built by chunk_and_vectorize"""
+    global CHROMA_CHUNK_COUNT
+    
     try:
         collection = init_chroma_db()
         
-        if not vectorized_chunks:
+        ids = vectorized_chunks["ids"]
+        if not ids:
             return {"status": "error", "message": "No chunks to store"}
         
-        # Prepare data for ChromaDB
-        ids = [chunk["chunk_id"] for chunk in vectorized_chunks]
-        embeddings = [chunk["embedding"] for chunk in vectorized_chunks]
-        documents = [chunk["chunk_text"] for chunk in vectorized_chunks]
-        metadatas = []
-        
-        for chunk in vectorized_chunks:
-            metadata = {
-                "file_path": chunk["file_path"],
-                "filename": chunk["filename"],
-                "chunk_index": chunk["chunk_index"],
-                "total_chunks": chunk["total_chunks"],
-                "created_at": chunk["created_at"]
-            }
-            metadatas.append(metadata)
-        
-        # Add to ChromaDB
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas
-        )
+        embeddings = vectorized_chunks["embeddings"]
+        documents = vectorized_chunks["documents"]
+        metadatas = vectorized_chunks["metadatas"]
+        
+        # Drop every chunk stored for these files by an earlier ingestion first, so an
+        # edited file that now has fewer chunks leaves no stale ones behind
+        file_paths = list(dict.fromkeys(metadata["file_path"] for metadata in metadatas))
+        collection.delete(where={"file_path": {"$in": file_paths}})
+        
+        # Upsert to ChromaDB in bounded batches (add would skip ids that already exist)
+        for batch_start in range(0, len(ids), batch_size):
+            batch_end = batch_start + batch_size
+            collection.upsert(
+                ids=ids[batch_start:batch_end],
+                embeddings=embeddings[batch_start:batch_end],
+                documents=documents[batch_start:batch_end],
+                metadatas=metadatas[batch_start:batch_end]
+            )
+        
+        # Re-count lazily on the next retrieval
+        CHROMA_CHUNK_COUNT = None
         
         return {
             "status": "success",
-            "message": f"Successfully stored {len(vectorized_chunks)} chunks in vector DB",
-            "chunks_count": len(vectorized_chunks),
+            "message": f"Successfully stored {len(ids)} chunks in vector DB",
+            "chunks_count": len(ids),
             "collection_name": collection.name
         }
         
@@ -263,19 +524,22 @@ def ingest_documents_pipeline(file_paths: List[str]) -> Dict[str, Any]:
     try:
         print(f"Starting ingestion pipeline for {len(file_paths)} files...")
         
+        # Single timestamp shared by every file and chunk in this run
+        now_iso = datetime.now().isoformat()
+        
         # Step 1: Extract text from files
-        documents = find_and_scan(file_paths)
+        documents = find_and_scan(file_paths, now_iso)
         if not documents:
             return {"status": "error", "message": "No documents could be processed"}
         
         print(f"Extracted text from {len(documents)} files")
         
         # Step 2: Chunk and vectorize
-        vectorized_chunks = chunk_and_vectorize(documents)
-        if not vectorized_chunks:
+        vectorized_chunks = chunk_and_vectorize(documents, now_iso=now_iso)
+        if not vectorized_chunks["ids"]:
             return {"status": "error", "message": "No chunks could be vectorized"}
         
-        print(f"Generated {len(vectorized_chunks)} vectorized chunks")
+        print(f"Generated {len(vectorized_chunks['ids'])} vectorized chunks")
         
         # Step 3: Push to database
         result = push_to_db(vectorized_chunks)
@@ -1,47 +1,68 @@
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Union
 import numpy as np
-import open_clip
-import torch
 from datetime import datetime, timedelta
 
 # Import existing globals and functions from ingest helpers
 from .rag_ingest_helpers import (
-    init_clip_model, init_chroma_db, 
+    init_clip_model, init_chroma_db, encode_text_tokens, get_chunk_count,
     CHROMA_CLIENT, CHROMA_COLLECTION, DB_EXPIRY_TIME
 )
 
 
-def vectorize_user_query(user_query: str) -> np.ndarray:
+def vectorize_user_query(user_query: Union[str, List[str]]) -> np.ndarray:
     """
-    Vectorize user query using the same CLIP model used for document chunks.
+    Vectorize user queries using the same CLIP model used for document chunks.
     
     Args:
-        user_query: The user's question/query as a string
+        user_query: The user's question/query as a string, or a list of queries
+                    to encode together in one batch
         
     Returns:
-        np.ndarray: Normalized embedding vector for the query
+        np.ndarray: Normalized embedding vectors, shape (number of queries, embedding dim)
     """
     try:
-        # Initialize CLIP model (reuses existing global model)
-        model, device = init_clip_model()
-        
-        # Tokenize and encode the user query
-        tokenizer = open_clip.get_tokenizer('ViT-B-32')
-        text_tokens = tokenizer([user_query]).to(device)
+        if isinstance(user_query, str):
+            user_query = [user_query]
         
-        with torch.no_grad():
-            query_features = model.encode_text(text_tokens)
-            # Normalize the features (same as chunk embeddings)
-            query_features = query_features / query_features.norm(dim=-1, keepdim=True)
+        # Initialize CLIP model (reuses existing global model and tokenizer)
+        _, tokenizer, _ = init_clip_model()
         
-        return query_features.cpu().numpy()[0]  # Return single embedding
+        # Tokenize and encode the user queries (normalized, same as chunk embeddings)
+        return encode_text_tokens(tokenizer(user_query))
         
     except Exception as e:
         raise Exception(f"Error vectorizing user query: {str(e)}")
 
 
+def _retrieve_raw(collection, query_embeddings: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray, List[str], List[Dict[str, Any]]]:
+    """
+    Run the similarity search and return the raw result columns for the first query.
+    
+    Args:
+        collection: ChromaDB collection to search
+        query_embeddings: Query embeddings, shape (1, embedding dim)
+        top_k: Number of most similar chunks to retrieve
+        
+    Returns:
+        Tuple of (chunk ids, cosine distances, chunk texts, metadatas), best match first
+    """
+    # Use ChromaDB's built-in similarity search (more efficient than manual calculation).
+    # It caps n_results at the collection size itself, so no count() round-trip is needed.
+    query_results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=top_k,
+        include=["documents", "metadatas", "distances"]
+    )
+    
+    # ChromaDB returns results in lists (even for single query)
+    ids = np.asarray(query_results["ids"][0], dtype=object)
+    distances = np.asarray(query_results["distances"][0], dtype=np.float32)
+    
+    return ids, distances, query_results["documents"][0], query_results["metadatas"][0]
+
+
 def cosine_similarity_and_retrieve(user_query: str, top_k: int = 5) -> Dict[str, Any]:
     """
     Retrieve most relevant chunks based on cosine similarity with user query.
@@ -61,52 +82,37 @@ def cosine_similarity_and_retrieve(user_query: str, top_k: int = 5) -> Dict[str,
         if not collection:
             return {"status": "error", "message": "ChromaDB collection not available"}
         
-        # Check if collection has any documents
-        collection_count = collection.count()
-        if collection_count == 0:
+        # Vectorize user query
+        # Shape (1, D) float32 array, passed to ChromaDB as-is
+        query_embeddings = vectorize_user_query(user_query)
+        
+        ids, distances, documents, metadatas = _retrieve_raw(collection, query_embeddings, top_k)
+        
+        # An empty collection returns no matches
+        if len(ids) == 0:
             return {"status": "error", "message": "No documents found in vector database"}
         
-        # Vectorize user query
-        query_embedding = vectorize_user_query(user_query)
-        
-        # Use ChromaDB's built-in similarity search (more efficient than manual calculation)
-        query_results = collection.query(
-            query_embeddings=[query_embedding.tolist()],
-            n_results=min(top_k, collection_count),  # Don't request more than available
-            include=["documents", "metadatas", "distances"]
-        )
-        
-        # Prepare results with unique chunks
-        retrieved_chunks = []
-        seen_chunk_ids = set()
-        
-        # ChromaDB returns results in lists (even for single query)
-        ids = query_results["ids"][0]
-        documents = query_results["documents"][0]
-        metadatas = query_results["metadatas"][0]
-        distances = query_results["distances"][0]
-        
-        for i, chunk_id in enumerate(ids):
-            # Ensure uniqueness
-            if chunk_id not in seen_chunk_ids:
-                seen_chunk_ids.add(chunk_id)
-                
-                # Convert distance to similarity score (ChromaDB uses cosine distance)
-                # Cosine distance = 1 - cosine similarity, so similarity = 1 - distance
-                similarity_score = 1.0 - distances[i]
-                
-                chunk_info = {
-                    "chunk_id": chunk_id,
-                    "chunk_text": documents[i],
-                    "similarity_score": float(similarity_score),
-                    "metadata": metadatas[i]
-                }
-                retrieved_chunks.append(chunk_info)
+        # Convert distance to similarity score (ChromaDB uses cosine distance)
+        # Cosine distance = 1 - cosine similarity, so similarity = 1 - distance
+        similarity_scores = (1.0 - distances).tolist()
+        
+        # Build the response dicts only here, at the API boundary. Chunk ids are
+        # unique within a collection, so the results need no de-duplication.
+        retrieved_chunks = [
+            {
+                "chunk_id": chunk_id,
+                "chunk_text": chunk_text,
+                "similarity_score": similarity_score,
+                "metadata": metadata
+            }
+            for chunk_id, chunk_text, similarity_score, metadata
+            in zip(ids.tolist(), documents, similarity_scores, metadatas)
+        ]
         
         return {
             "status": "success",
             "query": user_query,
-            "total_chunks_searched": collection_count,
+            "total_chunks_searched": get_chunk_count(collection),
             "retrieved_chunks": retrieved_chunks,
             "retrieved_count": len(retrieved_chunks)
         }